@@ -1,14 +1,17 @@
 import os
+import json
+import shutil
+import hashlib
+import time
 import logging
-import zipfile
-from flask import Flask, render_template, request, flash, redirect, url_for, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, flash, redirect, url_for, send_from_directory, abort, session
 from werkzeug.middleware.proxy_fix import ProxyFix
 import tempfile
+from io import BytesIO
 from normalizer import SatelliteImageNormalizer
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -21,6 +24,11 @@ ALLOWED_EXTENSIONS = {'zip'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 
+# Normalization results, keyed by upload content hash
+CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'cache')
+MAX_CACHE_ENTRIES = 20
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -54,54 +62,29 @@ def upload_file():
             return redirect(request.url)
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        # Create output directory
-        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'output')
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        start_time = time.time()
         
-        # Create original images directory for comparison
-        original_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'original')
-        if not os.path.exists(original_dir):
-            os.makedirs(original_dir)
+        # Keep the upload in memory; it is hashed below and ZipFile reads it in place
+        file_bytes = file.read()
         
-        # Extract original images for side-by-side comparison
-        original_files = []
-        try:
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                # Extract original images
-                for i, file_info in enumerate(zip_ref.filelist):
-                    if file_info.filename.lower().endswith('.png'):
-                        # Extract to original directory
-                        original_name = f"original_image{i+1}.png"
-                        with open(os.path.join(original_dir, original_name), 'wb') as f:
-                            f.write(zip_ref.read(file_info.filename))
-                        original_files.append(original_name)
-        except Exception as e:
-            logger.error(f"Error extracting original images: {str(e)}")
+        # Results depend only on the ZIP content and the target, so cache them under that hash
+        cache_key = hashlib.sha256(file_bytes + repr(target_intensity).encode()).hexdigest()
+        cache_dir = os.path.join(CACHE_FOLDER, cache_key)
         
-        # Process the file
-        normalizer = SatelliteImageNormalizer(
-            zip_path=file_path,
-            output_dir=output_dir,
-            target_intensity=target_intensity
-        )
-        
-        success, result_data, saved_paths = normalizer.process_all()
+        result_data = load_cached_result(cache_dir)
+        if result_data is not None:
+            logger.info(f"Serving cached results for {cache_key}")
+            # Report this request's time; the stored figure belongs to the run that filled the cache
+            result_data['original_processing_time'] = result_data.get('processing_time')
+            result_data['processing_time'] = time.time() - start_time
+            result_data['cached'] = True
+            success = True
+        else:
+            success, result_data = process_into_cache(file_bytes, target_intensity, cache_dir)
         
         if success:
-            # Add original images to the result (result_data is a dictionary)
-            if isinstance(result_data, dict):
-                result_data['original_images'] = original_files
-            else:
-                # If for some reason result is not a dict, create a new one
-                result_data = {
-                    'error': 'Could not process data properly, result was not a dictionary',
-                    'original_images': original_files
-                }
+            # The image routes serve this visitor's most recent result straight from the cache
+            session['cache_key'] = cache_key
             
             # Use the new dashboard template for better visualization
             return render_template('results_dashboard.html', 
@@ -115,20 +98,91 @@ def upload_file():
         flash('File type not allowed. Please upload a ZIP file.')
         return redirect(request.url)
 
+def load_cached_result(cache_dir):
+    """Return the cached stats for cache_dir, or None if the entry is missing or was just evicted."""
+    try:
+        with open(os.path.join(cache_dir, 'stats.json')) as f:
+            result_data = json.load(f)
+        os.utime(cache_dir)  # Mark as recently used for eviction
+    except OSError:
+        return None
+    return result_data
+
+def process_into_cache(file_bytes, target_intensity, cache_dir):
+    """Normalize an uploaded ZIP into a scratch directory and publish it as cache_dir on success."""
+    work_dir = tempfile.mkdtemp(prefix='.tmp-', dir=CACHE_FOLDER)
+    try:
+        original_dir = os.path.join(work_dir, 'original')
+        os.makedirs(original_dir)
+        
+        # Process the file
+        normalizer = SatelliteImageNormalizer(
+            zip_path=BytesIO(file_bytes),
+            output_dir=os.path.join(work_dir, 'output'),
+            target_intensity=target_intensity
+        )
+        
+        # Originals for side-by-side comparison are written during the same ZIP pass
+        success, result_data, saved_paths = normalizer.process_all(original_dir=original_dir)
+        if not success:
+            return False, result_data
+        
+        # Add original images to the result (result_data is a dictionary)
+        if isinstance(result_data, dict):
+            result_data['original_images'] = normalizer.original_files
+        else:
+            # If for some reason result is not a dict, create a new one
+            return True, {
+                'error': 'Could not process data properly, result was not a dictionary',
+                'original_images': normalizer.original_files
+            }
+        
+        with open(os.path.join(work_dir, 'stats.json'), 'w') as f:
+            json.dump(result_data, f)
+        
+        # Publish atomically; if a concurrent request already published this key, keep theirs
+        try:
+            os.rename(work_dir, cache_dir)
+        except OSError:
+            pass
+        evict_cache()
+        return True, result_data
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def evict_cache():
+    """Remove the least recently used cache entries beyond MAX_CACHE_ENTRIES."""
+    entries = [os.path.join(CACHE_FOLDER, name) for name in os.listdir(CACHE_FOLDER)
+               if not name.startswith('.tmp-')]
+    entries.sort(key=cache_entry_mtime, reverse=True)
+    for entry in entries[MAX_CACHE_ENTRIES:]:
+        shutil.rmtree(entry, ignore_errors=True)
+
+def cache_entry_mtime(entry):
+    """Modification time of a cache entry; entries removed by a concurrent request sort as oldest."""
+    try:
+        return os.path.getmtime(entry)
+    except OSError:
+        return 0.0
+
+def cache_subdir(subdir):
+    """Directory of the current session's cached result, rejecting anything that is not a SHA-256 key."""
+    cache_key = session.get('cache_key', '')
+    if len(cache_key) != 64 or any(c not in '0123456789abcdef' for c in cache_key):
+        abort(404)
+    return os.path.join(CACHE_FOLDER, cache_key, subdir)
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
-    return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER'], 'output'),
-                               filename, as_attachment=True)
+    return send_from_directory(cache_subdir('output'), filename, as_attachment=True)
 
 @app.route('/output/<path:filename>')
 def serve_image(filename):
-    return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER'], 'output'),
-                               filename)
+    return send_from_directory(cache_subdir('output'), filename)
 
 @app.route('/original/<path:filename>')
 def serve_original(filename):
-    return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER'], 'original'),
-                               filename)
+    return send_from_directory(cache_subdir('original'), filename)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,15 +1,44 @@
 import os
+import zlib
 import zipfile
 import numpy as np
+import cv2
 from PIL import Image
 import logging
-from io import BytesIO
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional ISA-L backend for reading ZIP members. zipfile looks up zlib through its module
+# global, so it gets a shim that sends only decompressobj (inflate) to isal_zlib; compression
+# stays on stdlib zlib, since ISA-L only supports levels 0-3.
+try:
+    from isal import isal_zlib
+except ImportError:
+    pass
+else:
+    class _IsalInflateZlib:
+        """zlib stand-in for zipfile: ISA-L decompressobj, stdlib zlib for everything else."""
+        decompressobj = staticmethod(isal_zlib.decompressobj)
+        
+        def __getattr__(self, name):
+            return getattr(zlib, name)
+    
+    zipfile.zlib = _IsalInflateZlib()
 
-import matplotlib.pyplot as plt
+
+def _thread_map(func, *iterables):
+    """Apply func across the iterables on a thread pool sized to the work, yielding results in order."""
+    items = list(zip(*iterables))
+    workers = max(1, min(os.cpu_count() or 1, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(lambda args: func(*args), items)
 
 
 # Add this function at the top
 def plot_intensity_distribution(before_path, after_path, title_prefix=""):
+    # Imported lazily: matplotlib is only needed for plotting, not for normalization
+    import matplotlib.pyplot as plt
+    
     img_before = Image.open(before_path).convert("L")
     img_after = Image.open(after_path).convert("L")
     arr_before = np.array(img_before).flatten()
@@ -33,7 +62,7 @@ def plot_intensity_distribution(before_path, after_path, title_prefix=""):
 
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class SatelliteImageNormalizer:
@@ -44,7 +73,8 @@ class SatelliteImageNormalizer:
         Initialize the normalizer.
         
         Args:
-            zip_path (str): Path to the ZIP file containing images
+            zip_path (str or file-like): Path to the ZIP file containing images, or an
+                in-memory file object holding the ZIP data
             output_dir (str): Directory to save normalized images
             target_intensity (float, optional): Target intensity for normalization.
                 If None, the global average is used.
@@ -53,16 +83,28 @@ class SatelliteImageNormalizer:
         self.output_dir = output_dir
         self.target_intensity = target_intensity
         self.images = []
-        self.image_arrays = []
+        self.stack = None
+        self.hists = None
+        self.normalized_stack = None
+        self.normalized_means = None
+        self.original_files = []
+        self.image_means = None
         self.global_avg = None
         
         # Ensure output directory exists
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
     
-    def extract_images(self):
-        """Extract images from the ZIP file."""
-        logger.info(f"Extracting images from {self.zip_path}")
+    def extract_images(self, original_dir=None):
+        """
+        Extract images from the ZIP file.
+        
+        Args:
+            original_dir (str, optional): Directory to also write the untouched PNG files to,
+                as original_image1.png, original_image2.png, ... in the same pass.
+        """
+        source = self.zip_path if isinstance(self.zip_path, (str, os.PathLike)) else "in-memory ZIP"
+        logger.info(f"Extracting images from {source}")
         
         try:
             with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
@@ -78,18 +120,15 @@ class SatelliteImageNormalizer:
                 
                 logger.info(f"Found {len(image_files)} images in the ZIP file")
                 
-                # Extract and load each image
-                for img_file in image_files:
-                    img_data = zip_ref.read(img_file)
-                    img = Image.open(BytesIO(img_data)).convert('L')  # Convert to grayscale
-                    
-                    # Verify image dimensions (should be 256x256)
-                    if img.width != 256 or img.height != 256:
-                        logger.warning(f"Image {os.path.basename(img_file)} has dimensions {img.width}x{img.height}, expected 256x256")
-                        # Resize if needed
-                        img = img.resize((256, 256))
-                    
-                    self.images.append((os.path.basename(img_file), img))
+                # Optional copies of the original files, written from the same member reads
+                self.original_files = []
+                original_paths = [None] * len(image_files)
+                if original_dir is not None:
+                    self.original_files = [f"original_image{i+1}.png" for i in range(len(image_files))]
+                    original_paths = [os.path.join(original_dir, name) for name in self.original_files]
+                
+                # Decode members concurrently; zlib inflate and PIL decoding release the GIL
+                self.images = list(_thread_map(partial(self._read_image, zip_ref), image_files, original_paths))
                 
                 logger.info(f"Successfully extracted {len(self.images)} images")
                 return len(self.images)
@@ -101,32 +140,110 @@ class SatelliteImageNormalizer:
             logger.error(f"Unexpected error while extracting images: {str(e)}")
             raise ValueError(f"Error processing ZIP file: {str(e)}")
     
+    def _read_image(self, zip_ref, img_file, original_path=None):
+        """Read and decode a single PNG member of the ZIP file as a 256x256 grayscale array."""
+        img_data = zip_ref.read(img_file)
+        if original_path is not None:
+            with open(original_path, 'wb') as f:
+                f.write(img_data)
+        
+        # Decode straight to a contiguous uint8 grayscale buffer
+        img = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"Could not decode image {os.path.basename(img_file)}")
+        
+        # Verify image dimensions (should be 256x256)
+        height, width = img.shape
+        if width != 256 or height != 256:
+            logger.warning("Image %s has dimensions %dx%d, expected 256x256", os.path.basename(img_file), width, height)
+            # Resize if needed: INTER_AREA averages source pixels when shrinking (no aliasing),
+            # INTER_LINEAR interpolates when enlarging
+            interpolation = cv2.INTER_AREA if width > 256 or height > 256 else cv2.INTER_LINEAR
+            img = cv2.resize(img, (256, 256), interpolation=interpolation)
+        
+        return os.path.basename(img_file), img
+    
     def load_images(self):
         """Load images into NumPy arrays for processing."""
         logger.info("Converting images to arrays")
         
-        self.image_arrays = []
-        for _, img in self.images:
-            # Convert PIL image to NumPy array
-            img_array = np.array(img, dtype=np.float32)
-            self.image_arrays.append(img_array)
+        # Preallocate one contiguous (N, 256, 256) buffer and copy each decoded image in once
+        self.stack = np.empty((len(self.images), 256, 256), dtype=np.uint8)
+        # 256-bin histograms: every later average is a 256-element dot product instead of a full-image sum
+        self.hists = np.empty((len(self.images), 256), dtype=np.float64)
+        for i, (_, img) in enumerate(self.images):
+            self.stack[i] = img
+            self.hists[i] = cv2.calcHist([img], [0], None, [256], [0, 256]).ravel()
         
-        logger.info(f"Converted {len(self.image_arrays)} images to arrays")
+        logger.info(f"Converted {len(self.stack)} images to arrays")
     
     def calculate_global_average(self):
         """Calculate the global average intensity across all images."""
-        if not self.image_arrays:
+        if self.stack is None or len(self.stack) == 0:
             raise ValueError("No images loaded. Call load_images() first.")
         
-        # Concatenate all arrays and calculate the mean
-        all_pixels = np.concatenate([img.flatten() for img in self.image_arrays])
-        self.global_avg = np.mean(all_pixels)
+        # Per-image averages are kept for normalize_images; all images are 256x256,
+        # so the global average is simply the mean of the per-image averages
+        self.image_means = self.hists @ np.arange(256, dtype=np.float64) / self.hists.sum(axis=1)
+        self.global_avg = float(self.image_means.mean())
         
         logger.info(f"Global average intensity: {self.global_avg}")
         return self.global_avg
     
-    def normalize_images(self):
-        """Normalize each image to match the global average intensity."""
+    def _solve_luts(self, hists, scales, target, tolerance=0.5, max_iter=20):
+        """
+        Build one uint8 LUT clip(round(x * scale + bias)) per image whose output mean hits the target.
+        
+        The mean of a LUT-mapped image is sum(hist * lut) / sum(hist), so the biases for the
+        whole stack are found by a single vectorized bisection over the (N, 256) histograms
+        instead of re-reading any image.
+        
+        Args:
+            hists (ndarray): (N, 256) intensity histograms of the source images
+            scales (ndarray): (N,) multiplicative factors applied before the bias
+            target (float): Desired average intensity
+            tolerance (float): Acceptable distance from the target
+            max_iter (int): Maximum number of bisection steps
+        
+        Returns:
+            ndarray: (N, 256) uint8 lookup tables
+        """
+        levels = np.arange(256, dtype=np.float64) * scales[:, None]
+        totals = hists.sum(axis=1)
+        
+        def luts_for(biases):
+            # Clipping happens here on the 256-entry tables, never per pixel
+            return np.clip(np.rint(levels + biases[:, None]), 0, 255).astype(np.uint8)
+        
+        def means_for(luts):
+            return (hists * luts).sum(axis=1) / totals
+        
+        best_luts = luts_for(np.zeros(len(scales)))
+        best_err = np.abs(means_for(best_luts) - target)
+        low = np.full(len(scales), -255.0)
+        high = np.full(len(scales), 255.0)
+        
+        for _ in range(max_iter):
+            active = best_err > tolerance
+            if not active.any():
+                break
+            biases = (low + high) / 2
+            luts = luts_for(biases)
+            means = means_for(luts)
+            err = np.abs(means - target)
+            
+            improved = active & (err < best_err)
+            best_luts[improved] = luts[improved]
+            best_err[improved] = err[improved]
+            
+            below = means < target
+            low = np.where(active & below, biases, low)
+            high = np.where(active & ~below, biases, high)
+        
+        return best_luts
+    
+    def _prepare_normalization(self):
+        """Resolve the target, solve one LUT per image and allocate normalized_stack; returns (target, luts)."""
         if self.global_avg is None:
             self.calculate_global_average()
         
@@ -134,55 +251,50 @@ class SatelliteImageNormalizer:
         target = self.target_intensity if self.target_intensity is not None else self.global_avg
         logger.info(f"Normalizing images to target intensity: {target}")
         
-        normalized_images = []
+        # Scaling factors for the whole stack
+        means = self.image_means
+        for i in np.flatnonzero(means <= 0):  # Avoid division by zero
+            logger.warning("Image %d has zero average intensity, using scaling factor of 1.0", i + 1)
+        scales = np.where(means > 0, target / np.where(means > 0, means, 1.0), 1.0)
         
-        for i, img_array in enumerate(self.image_arrays):
-            # Calculate current average intensity
-            current_avg = np.mean(img_array)
-            logger.debug(f"Image {i+1} - Current average: {current_avg}")
-            
-            # Calculate scaling factor
-            if current_avg > 0:  # Avoid division by zero
-                scaling_factor = target / current_avg
-            else:
-                scaling_factor = 1.0
-                logger.warning(f"Image {i+1} has zero average intensity, using scaling factor of 1.0")
-            
-            # Apply scaling factor (optimize by doing in-place if possible)
-            normalized = img_array * scaling_factor
-            
-            # Ensure values are within 0-255 range
-            normalized = np.clip(normalized, 0, 255)
-            
-            # Convert back to proper image format
-            normalized = normalized.astype(np.uint8)
-            
-            # Calculate new average to verify
-            new_avg = np.mean(normalized)
-            logger.debug(f"Image {i+1} - New average: {new_avg}, Target: {target}")
-            
-            # Verify normalization accuracy
+        # Solve every scale/bias LUT at once, then touch the pixels once
+        luts = self._solve_luts(self.hists, scales, target)
+        
+        # Resulting averages follow from the histograms and LUTs without reading any pixels
+        self.normalized_means = (self.hists * luts).sum(axis=1) / self.hists.sum(axis=1)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for i, new_avg in enumerate(self.normalized_means):
+            if debug:
+                logger.debug("Image %d - Current average: %s", i + 1, means[i])
+                logger.debug("Image %d - New average: %s, Target: %s", i + 1, new_avg, target)
             if abs(new_avg - target) > 1.0:
-                logger.warning(f"Image {i+1} - Normalization not within ±1 threshold: {new_avg} vs {target}")
-                
-                # Apply fine adjustment if needed (more accurate adjustment)
-                adjustment = target - new_avg
-                # Convert back to float32 for precise adjustment
-                normalized = np.clip(normalized.astype(np.float32) + adjustment, 0, 255).astype(np.uint8)
-                final_avg = np.mean(normalized)
-                logger.debug(f"Image {i+1} - After adjustment: {final_avg}")
-                
-                # If still not within threshold, apply a secondary proportional adjustment
-                if abs(final_avg - target) > 1.0:
-                    logger.warning(f"Image {i+1} - Secondary adjustment needed")
-                    sec_factor = target / final_avg
-                    normalized = np.clip(normalized.astype(np.float32) * sec_factor, 0, 255).astype(np.uint8)
-                    final_avg = np.mean(normalized)
-                    logger.debug(f"Image {i+1} - After secondary adjustment: {final_avg}")
-            
-            # Create PIL image from array
-            normalized_img = Image.fromarray(normalized)
-            normalized_images.append(normalized_img)
+                logger.warning("Image %d - Normalization not within ±1 threshold: %s vs %s", i + 1, new_avg, target)
+        
+        # Images are independent and cv2 releases the GIL, so workers each write their own output slice
+        self.normalized_stack = np.empty_like(self.stack)
+        return target, luts
+    
+    def _apply_lut(self, i, lut):
+        """Map image i of the stack through its LUT into the matching slice of normalized_stack."""
+        return cv2.LUT(self.stack[i], lut, dst=self.normalized_stack[i])
+    
+    def _output_path(self, i):
+        """Path of the i-th normalized image in the output directory."""
+        return os.path.join(self.output_dir, f"normalized_image{i+1}.png")
+    
+    def _save_image(self, img, output_path):
+        """Save a PIL image as PNG; zlib level 1 is several times faster than the default 6."""
+        img.save(output_path, compress_level=1)
+        logger.info("Saved normalized image to %s", output_path)
+        return output_path
+    
+    def normalize_images(self):
+        """Normalize each image to match the global average intensity."""
+        target, luts = self._prepare_normalization()
+        list(_thread_map(self._apply_lut, range(len(self.stack)), luts))
+        
+        # Create PIL images from the output arrays
+        normalized_images = [Image.fromarray(normalized) for normalized in self.normalized_stack]
         
         logger.info(f"Successfully normalized {len(normalized_images)} images")
         return normalized_images
@@ -192,27 +304,54 @@ class SatelliteImageNormalizer:
         if normalized_images is None:
             normalized_images = self.normalize_images()
         
-        saved_paths = []
+        # Encode PNGs concurrently
+        paths = [self._output_path(i) for i in range(len(normalized_images))]
+        return list(_thread_map(self._save_image, normalized_images, paths))
+    
+    def process_iter(self, original_dir=None):
+        """
+        Run the normalization process, yielding each image's statistics as soon as it is saved.
+        
+        Args:
+            original_dir (str, optional): Directory to copy the original PNG files to while extracting
+        
+        Yields:
+            tuple: (index, stats) for each normalized image, in order
+        """
+        self.extract_images(original_dir)
+        self.load_images()
+        self.calculate_global_average()
+        target, luts = self._prepare_normalization()
         
-        for i, img in enumerate(normalized_images):
-            output_path = os.path.join(self.output_dir, f"normalized_image{i+1}.png")
-            img.save(output_path)
-            logger.info(f"Saved normalized image to {output_path}")
-            saved_paths.append(output_path)
+        def normalize_and_save(i, lut):
+            return self._save_image(Image.fromarray(self._apply_lut(i, lut)), self._output_path(i))
         
-        return saved_paths
+        # Results arrive in order as each image is written, while later images are still in flight
+        for i, output_path in enumerate(_thread_map(normalize_and_save, range(len(self.stack)), luts)):
+            # Verify the image is within target range (±1)
+            avg_intensity = float(self.normalized_means[i])
+            difference = abs(avg_intensity - target)
+            
+            yield i, {
+                "filename": os.path.basename(output_path),
+                "average_intensity": avg_intensity,
+                "difference_from_target": difference,
+                "within_threshold": difference <= 1.0
+            }
     
-    def process_all(self):
-        """Run the complete normalization process."""
+    def process_all(self, original_dir=None):
+        """
+        Run the complete normalization process.
+        
+        Args:
+            original_dir (str, optional): Directory to copy the original PNG files to while extracting
+        """
         try:
             import time
             start_time = time.time()
             
-            self.extract_images()
-            self.load_images()
-            self.calculate_global_average()
-            normalized_images = self.normalize_images()
-            saved_paths = self.save_normalized_images(normalized_images)
+            image_stats = [stats for _, stats in self.process_iter(original_dir)]
+            saved_paths = [os.path.join(self.output_dir, stats["filename"]) for stats in image_stats]
             
             end_time = time.time()
             processing_time = end_time - start_time
@@ -222,36 +361,17 @@ class SatelliteImageNormalizer:
                 "global_average": self.global_avg,
                 "image_count": len(self.images),
                 "processing_time": processing_time,
-                "normalized_images": []
+                "normalized_images": image_stats
             }
             
-            # Verify all images are within target range (±1)
-            images_within_threshold = 0
-            target = self.target_intensity if self.target_intensity is not None else self.global_avg
-            
-            for i, img in enumerate(normalized_images):
-                img_array = np.array(img)
-                avg_intensity = np.mean(img_array)
-                difference = abs(avg_intensity - target)
-                
-                # Check if within threshold
-                within_threshold = difference <= 1.0
-                if within_threshold:
-                    images_within_threshold += 1
-                
-                stats["normalized_images"].append({
-                    "filename": f"normalized_image{i+1}.png",
-                    "average_intensity": avg_intensity,
-                    "difference_from_target": difference,
-                    "within_threshold": within_threshold
-                })
+            images_within_threshold = sum(1 for img_stats in image_stats if img_stats["within_threshold"])
             
             # Add score calculation as per requirements
             stats["images_within_threshold"] = images_within_threshold
-            stats["score"] = (images_within_threshold / len(normalized_images)) * 10 if normalized_images else 0
+            stats["score"] = (images_within_threshold / len(image_stats)) * 10 if image_stats else 0
             
             logger.info(f"Processing completed in {processing_time:.2f} seconds")
-            logger.info(f"Score: {stats['score']:.1f}/10 ({images_within_threshold}/{len(normalized_images)} images within threshold)")
+            logger.info(f"Score: {stats['score']:.1f}/10 ({images_within_threshold}/{len(image_stats)} images within threshold)")
             
             return True, stats, saved_paths
         
@@ -0,0 +1,40 @@
+import io
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+isal_zlib = pytest.importorskip("isal.isal_zlib")
+
+from normalizer import SatelliteImageNormalizer
+
+
+def test_shim_routes_only_inflate_to_isal():
+    assert zipfile.zlib.decompressobj is isal_zlib.decompressobj
+    assert zipfile.zlib.compressobj is not isal_zlib.compressobj
+
+
+@pytest.mark.parametrize("level", [1, 6, 9])
+def test_deflated_zip_round_trip(level):
+    payload = bytes(range(256)) * 512
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=level) as zip_ref:
+        zip_ref.writestr('payload.bin', payload)
+
+    with zipfile.ZipFile(buffer) as zip_ref:
+        assert zip_ref.read('payload.bin') == payload
+
+
+def test_extract_images_from_deflated_zip(tmp_path):
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, size=(256, 256), dtype=np.uint8) for _ in range(3)]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zip_ref:
+        for i, img in enumerate(images):
+            zip_ref.writestr(f"image{i+1}.png", cv2.imencode('.png', img)[1].tobytes())
+
+    normalizer = SatelliteImageNormalizer(zip_path=buffer, output_dir=str(tmp_path))
+    assert normalizer.extract_images() == len(images)
+    for (_, decoded), img in zip(normalizer.images, images):
+        np.testing.assert_array_equal(decoded, img)
@@ -0,0 +1,50 @@
+import io
+import os
+import threading
+import zipfile
+
+import cv2
+import numpy as np
+
+from normalizer import SatelliteImageNormalizer
+
+
+def make_zip(count):
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_ref:
+        for i in range(count):
+            img = rng.integers(20 * i, 20 * i + 100, size=(256, 256), dtype=np.uint8)
+            zip_ref.writestr(f"image{i+1}.png", cv2.imencode('.png', img)[1].tobytes())
+    return buffer
+
+
+def test_first_image_is_yielded_before_later_images_are_saved(tmp_path):
+    count = 4
+    normalizer = SatelliteImageNormalizer(zip_path=make_zip(count), output_dir=str(tmp_path))
+
+    # Hold every save except the first until the first result has been received
+    release = threading.Event()
+    save_image = normalizer._save_image
+
+    def gated_save(img, output_path):
+        if not output_path.endswith("normalized_image1.png"):
+            assert release.wait(timeout=10)
+        return save_image(img, output_path)
+
+    normalizer._save_image = gated_save
+    results = normalizer.process_iter()
+    try:
+        index, stats = next(results)
+        assert index == 0
+        assert stats["filename"] == "normalized_image1.png"
+        assert os.path.exists(tmp_path / "normalized_image1.png")
+        for i in range(2, count + 1):
+            assert not os.path.exists(tmp_path / f"normalized_image{i}.png")
+    finally:
+        release.set()
+
+    remaining = list(results)
+    assert [index for index, _ in remaining] == list(range(1, count))
+    for i in range(1, count + 1):
+        assert os.path.exists(tmp_path / f"normalized_image{i}.png")
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from normalizer import SatelliteImageNormalizer
+
+
+def normalize(tmp_path, images, target):
+    """Run the production load/solve/apply path on in-memory uint8 images."""
+    normalizer = SatelliteImageNormalizer(output_dir=str(tmp_path), target_intensity=target)
+    normalizer.images = [(f"image{i+1}.png", img) for i, img in enumerate(images)]
+    normalizer.load_images()
+    normalizer.normalize_images()
+    return normalizer
+
+
+def assert_normalized(normalizer, images, target):
+    for img, predicted, normalized in zip(images, normalizer.normalized_means, normalizer.normalized_stack):
+        # Histogram-predicted mean matches the pixels actually written
+        assert predicted == pytest.approx(normalized.mean())
+        assert abs(normalized.mean() - target) <= 0.5
+        # The written pixels are the source mapped through a single LUT
+        lut = np.zeros(256, dtype=np.uint8)
+        lut[img.ravel()] = normalized.ravel()
+        np.testing.assert_array_equal(cv2.LUT(img, lut), normalized)
+
+
+def random_image(low, high, seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(low, high, size=(256, 256), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("target", [120.0, 250.0])
+def test_reachable_and_saturating_targets(tmp_path, target):
+    images = [random_image(0, 160, 1), random_image(40, 256, 2), random_image(0, 256, 3)]
+    normalizer = normalize(tmp_path, images, target)
+    assert_normalized(normalizer, images, target)
+
+
+def test_unclipped_target_scales_proportionally(tmp_path):
+    # No pixel saturates here, so each LUT should be round(x * target / mean) with a negligible bias
+    images = [random_image(0, 160, 1), random_image(40, 256, 2), random_image(0, 256, 3)]
+    normalizer = normalize(tmp_path, images, 120.0)
+    for img, normalized in zip(images, normalizer.normalized_stack):
+        expected = img.astype(np.float64) * 120.0 / img.mean()
+        assert np.abs(normalized - expected).max() <= 1.0
+
+
+def test_global_average_target(tmp_path):
+    images = [random_image(0, 100, 4), random_image(100, 256, 5)]
+    normalizer = normalize(tmp_path, images, None)
+    assert_normalized(normalizer, images, normalizer.global_avg)
+
+
+def test_all_zero_image(tmp_path):
+    images = [np.zeros((256, 256), dtype=np.uint8)]
+    normalizer = normalize(tmp_path, images, 50.0)
+    assert_normalized(normalizer, images, 50.0)
+
+
+def test_single_level_image(tmp_path):
+    images = [np.full((256, 256), 100, dtype=np.uint8)]
+    normalizer = normalize(tmp_path, images, 137.3)
+    assert_normalized(normalizer, images, 137.3)